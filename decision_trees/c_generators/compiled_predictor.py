@@ -0,0 +1,206 @@
+import ctypes
+import glob
+import hashlib
+import os
+import subprocess
+from typing import List, Union
+
+import numpy as np
+
+from decision_trees.utils.convert_to_fixed_point import get_integer_dtype
+from decision_trees.vhdl_generators.tree import Tree
+from decision_trees.vhdl_generators.random_forest import RandomForest
+
+
+class CompiledPredictor:
+    # generates an integer only C implementation of the own classifier (the same comparisons as in vhdl),
+    # compiles it to a shared library and uses it through ctypes to classify the data
+
+    def __init__(self, my_clf: Union[Tree, RandomForest], number_of_bits_per_input: int):
+        self.current_indent = 0
+
+        if isinstance(my_clf, RandomForest):
+            self._trees: List[Tree] = my_clf.random_forest
+        else:
+            self._trees = [my_clf]
+
+        self._filename = my_clf.filename
+        self._number_of_features = my_clf._number_of_features
+        # the compare values of the own classifier might use more bits than the input data
+        # (x << shift) <= t is the same as x <= (t >> shift) for integers, so the compare values are shifted instead
+        self._threshold_shift = my_clf._number_of_bits_per_feature - number_of_bits_per_input
+        self._input_dtype = get_integer_dtype(number_of_bits_per_input)
+        self._number_of_classes = len(self._trees[0].leaves[0].class_idx[0])
+
+        self._library = None
+
+    def build(self, path: str, compiler: str = 'cc'):
+        source = self._create_source()
+
+        # dlopen returns the already loaded library for a known path, so a rebuild at the same path would silently
+        # keep using the old code - the name of the library depends on the generated source code instead,
+        # which also allows to reuse the library if the same classifier was already built
+        source_hash = hashlib.md5((compiler + source).encode()).hexdigest()
+        source_file = os.path.join(path, self._filename + '.c')
+        library_file = os.path.abspath(os.path.join(path, f'{self._filename}_{source_hash}.so'))
+
+        if not os.path.exists(library_file):
+            # libraries left by previous builds are removed, only the currently used one is kept
+            for old_library_file in glob.glob(os.path.join(glob.escape(path), glob.escape(self._filename) + '_*.so')):
+                os.remove(old_library_file)
+
+            with open(source_file, 'w') as f:
+                f.write(source)
+
+            subprocess.run(
+                [compiler, '-O3', '-march=native', '-fPIC', '-shared', '-o', library_file, source_file], check=True
+            )
+
+        self._library = ctypes.CDLL(library_file)
+        self._library.predict.restype = None
+        self._library.predict.argtypes = [
+            np.ctypeslib.ndpointer(dtype=self._input_dtype, ndim=2, flags='C_CONTIGUOUS'),
+            ctypes.c_int64,
+            np.ctypeslib.ndpointer(dtype=np.int32, ndim=1, flags='C_CONTIGUOUS'),
+        ]
+
+    def predict(self, input_data_as_integers: np.ndarray) -> np.ndarray:
+        # input is expected to be already converted to integers (see convert_to_integer)
+        if self._library is None:
+            raise RuntimeError("The predictor has to be built before it is used!")
+
+        input_data_as_integers = np.ascontiguousarray(input_data_as_integers, dtype=self._input_dtype)
+        result_data = np.empty(len(input_data_as_integers), dtype=np.int32)
+
+        self._library.predict(input_data_as_integers, len(input_data_as_integers), result_data)
+
+        return result_data
+
+    def _insert_text_line_with_indent(self, text_to_insert) -> str:
+        return "\t" * self.current_indent + text_to_insert + "\n"
+
+    def _create_header(self) -> str:
+        text = ''
+        text += self._insert_text_line_with_indent("#include <stdint.h>")
+        text += self._insert_text_line_with_indent("")
+        text += self._insert_text_line_with_indent(f"#define NUMBER_OF_FEATURES {self._number_of_features}")
+        text += self._insert_text_line_with_indent(f"#define NUMBER_OF_CLASSES {self._number_of_classes}")
+        text += self._insert_text_line_with_indent(f"typedef {self._input_dtype.name}_t feature_t;")
+        text += self._insert_text_line_with_indent("")
+
+        return text
+
+    def _create_source(self) -> str:
+        text = self._create_header()
+
+        for i, tree in enumerate(self._trees):
+            text += self._add_tree_function(i, tree)
+
+        text += self._add_predict_function()
+
+        return text
+
+    def _add_tree_function(self, index: int, tree: Tree) -> str:
+        feature, threshold, left, right, value = tree.to_arrays()
+        threshold = threshold >> self._threshold_shift
+
+        text = ''
+        text += self._insert_text_line_with_indent(f"int32_t tree_{index}(const feature_t *x)")
+        text += self._insert_text_line_with_indent("{")
+        self.current_indent += 1
+        text += self._add_node(0, feature, threshold, left, right, value)
+        self.current_indent -= 1
+        text += self._insert_text_line_with_indent("}")
+        text += self._insert_text_line_with_indent("")
+
+        return text
+
+    def _add_node(self, node: int, feature, threshold, left, right, value) -> str:
+        text = ''
+
+        if left[node] < 0:
+            text += self._insert_text_line_with_indent(f"return {value[node]};")
+        else:
+            text += self._insert_text_line_with_indent(f"if (x[{feature[node]}] <= {threshold[node]}) {{")
+            self.current_indent += 1
+            text += self._add_node(left[node], feature, threshold, left, right, value)
+            self.current_indent -= 1
+            text += self._insert_text_line_with_indent("} else {")
+            self.current_indent += 1
+            text += self._add_node(right[node], feature, threshold, left, right, value)
+            self.current_indent -= 1
+            text += self._insert_text_line_with_indent("}")
+
+        return text
+
+    def _add_predict_function(self) -> str:
+        text = ''
+        text += self._insert_text_line_with_indent(
+            "void predict(const feature_t *data, int64_t number_of_samples, int32_t *result)"
+        )
+        text += self._insert_text_line_with_indent("{")
+        self.current_indent += 1
+        text += self._insert_text_line_with_indent("for (int64_t i = 0; i < number_of_samples; i++) {")
+        self.current_indent += 1
+        text += self._insert_text_line_with_indent("const feature_t *x = data + i * NUMBER_OF_FEATURES;")
+
+        if len(self._trees) == 1:
+            text += self._insert_text_line_with_indent("result[i] = tree_0(x);")
+        else:
+            text += self._insert_text_line_with_indent("int32_t votes[NUMBER_OF_CLASSES] = {0};")
+            for i in range(len(self._trees)):
+                text += self._insert_text_line_with_indent(f"votes[tree_{i}(x)]++;")
+
+            # in case of a tie the class with the lowest index is chosen, the same as in scikit
+            text += self._insert_text_line_with_indent("int32_t chosen_class = 0;")
+            text += self._insert_text_line_with_indent("for (int32_t c = 1; c < NUMBER_OF_CLASSES; c++) {")
+            self.current_indent += 1
+            text += self._insert_text_line_with_indent("if (votes[c] > votes[chosen_class]) {")
+            self.current_indent += 1
+            text += self._insert_text_line_with_indent("chosen_class = c;")
+            self.current_indent -= 1
+            text += self._insert_text_line_with_indent("}")
+            self.current_indent -= 1
+            text += self._insert_text_line_with_indent("}")
+            text += self._insert_text_line_with_indent("result[i] = chosen_class;")
+
+        self.current_indent -= 1
+        text += self._insert_text_line_with_indent("}")
+        self.current_indent -= 1
+        text += self._insert_text_line_with_indent("}")
+
+        return text
+
+
+def test_compiled_predictor():
+    import tempfile
+    from sklearn.datasets import load_digits
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from decision_trees.utils.convert_to_fixed_point import quantize_data, convert_to_integer
+
+    digits = load_digits()
+    data = digits.data / 16
+    train_data, test_data = data[:1200], data[1200:1400]
+    train_target = digits.target[:1200]
+
+    # 6/7 and 14/15 bits are the places where the integer type of the input changes
+    for number_of_bits in [1, 6, 7, 14, 15]:
+        train_data_quantized, test_data_quantized = quantize_data(train_data, test_data, number_of_bits)
+        test_data_as_integers = convert_to_integer(test_data, number_of_bits)
+
+        tree = Tree('DecisionTreeClassifier', 64, number_of_bits + 1)
+        tree.build(DecisionTreeClassifier(max_depth=8, random_state=42).fit(train_data_quantized, train_target))
+        random_forest = RandomForest('RandomForestClassifier', 64, number_of_bits + 1)
+        random_forest.build(
+            RandomForestClassifier(n_estimators=5, max_depth=8, random_state=42).fit(train_data_quantized, train_target)
+        )
+
+        for my_clf in [tree, random_forest]:
+            expected = [my_clf._predict_one_sample(sample) for sample in test_data_quantized]
+            assert np.array_equal(my_clf.predict(test_data_quantized), expected)
+
+            with tempfile.TemporaryDirectory() as path:
+                compiled_clf = CompiledPredictor(my_clf, number_of_bits)
+                compiled_clf.build(path)
+                assert np.array_equal(compiled_clf.predict(test_data_as_integers), expected)
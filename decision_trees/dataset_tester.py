@@ -1,16 +1,20 @@
 import time
-from typing import Union, Optional
+from typing import Tuple, Union, Optional, TextIO
 
 import numpy as np
 import os
+import subprocess
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn import metrics
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.tree import DecisionTreeClassifier
 
 from decision_trees.utils.constants import ClassifierType
 from decision_trees.vhdl_generators.tree import Tree
 from decision_trees.vhdl_generators.random_forest import RandomForest
-from decision_trees.utils.convert_to_fixed_point import quantize_data
+from decision_trees.c_generators.compiled_predictor import CompiledPredictor
+from decision_trees.utils.convert_to_fixed_point import quantize_data, convert_to_integer
 from decision_trees.utils.constants import get_classifier
 
 
@@ -20,7 +24,11 @@ def test_dataset(
         test_data: np.ndarray, test_target: np.ndarray,
         clf_type: ClassifierType,
         max_depth: Optional[int], number_of_classifiers: Optional[int],
-        path: str, name: str
+        path: str, name: str,
+        test_predicted: Optional[np.ndarray] = None,
+        number_of_jobs: Optional[int] = -1,
+        skip_unquantized: bool = False,
+        use_compiled_predictor: bool = False
 ):
     path = os.path.join(
         path,
@@ -28,46 +36,82 @@ def test_dataset(
     )
     result_file = os.path.join(path, 'score.txt')
 
-    if not os.path.exists(path):
-        os.makedirs(path)
-
-    # first create classifier from scikit
-    clf = get_classifier(clf_type, max_depth, number_of_classifiers)
-
-    # first - train the classifiers on non-quantized data
-    clf.fit(train_data, train_target)
-    test_predicted = clf.predict(test_data)
-    print("scikit clf with test data:")
-    report_performance(clf, clf_type, test_target, test_predicted, result_file)
-
-    # perform quantization of train and test data
-    # while at some point I was considering not quantizing the test data,
-    # I came to a conclusion that it is not the way it will be performed in hardware
-    train_data_quantized, test_data_quantized = quantize_data(
-        train_data, test_data, number_of_bits_per_feature,
-        flag_save_details_to_file=True, path=path
-    )
-
-    clf.fit(train_data_quantized, train_target)
-    test_predicted_quantized = clf.predict(test_data_quantized)
-    print("scikit clf with train and test data quantized:")
-    report_performance(clf, clf_type, test_target, test_predicted_quantized, result_file)
+    os.makedirs(path, exist_ok=True)
+
+    # the file is opened once for all the reports (with a big buffer) instead of reopening it for every report
+    with open(result_file, 'a', buffering=65536) as result_sink:
+        # first create classifier from scikit (it is also used as the description of the trained ones in reports)
+        clf_configuration = get_classifier(clf_type, max_depth, number_of_classifiers, number_of_jobs)
+
+        # perform quantization of train and test data
+        # while at some point I was considering not quantizing the test data,
+        # I came to a conclusion that it is not the way it will be performed in hardware
+        train_data_quantized, test_data_quantized = quantize_data(
+            train_data, test_data, number_of_bits_per_feature,
+            flag_save_details_to_file=True, path=path
+        )
+
+        # train the classifiers on non-quantized and quantized data - they are independent, so it is done in parallel
+        # (training on non-quantized data is skipped if the predictions were already provided,
+        # e.g. when only the number of bits changes between calls)
+        flag_train_unquantized = not skip_unquantized and test_predicted is None
+        data_to_train = [train_data, train_data_quantized] if flag_train_unquantized else [train_data_quantized]
+        classifiers = [clone(clf_configuration) for _ in data_to_train]
+        # the available jobs are split between the classifiers trained at the same time to avoid oversubscription
+        if 'n_jobs' in clf_configuration.get_params():
+            for classifier in classifiers:
+                classifier.set_params(n_jobs=max(1, effective_n_jobs(number_of_jobs) // len(classifiers)))
+        trained_classifiers = Parallel(n_jobs=len(data_to_train), prefer='threads')(
+            delayed(classifier.fit)(data, train_target) for classifier, data in zip(classifiers, data_to_train)
+        )
+        if 'n_jobs' in clf_configuration.get_params():
+            for classifier in trained_classifiers:
+                classifier.set_params(n_jobs=number_of_jobs)
+        clf = trained_classifiers[-1]
+
+        if flag_train_unquantized:
+            test_predicted = trained_classifiers[0].predict(test_data)
+        if not skip_unquantized:
+            print("scikit clf with test data:")
+            report_performance(clf_configuration, clf_type, test_target, test_predicted, result_sink)
+
+        test_predicted_quantized = clf.predict(test_data_quantized)
+        print("scikit clf with train and test data quantized:")
+        report_performance(clf, clf_type, test_target, test_predicted_quantized, result_sink)
 
     # generate own classifier based on the one from scikit
     number_of_features = len(train_data[0])
     # TODO(MF): this +1 is very important because the comparison values are not quantized
     my_clf = generate_my_classifier(clf, number_of_features, number_of_bits_per_feature+1, path)
-    my_clf_test_predicted_quantized = my_clf.predict(test_data_quantized)
+    # the own classifier is evaluated with its jit compiled model, optionally the integer only C counterpart can be
+    # used instead (it is not faster and compiling a big forest takes minutes, so it is off by default)
+    my_clf_test_predicted_quantized = None
+    if use_compiled_predictor:
+        try:
+            compiled_clf = CompiledPredictor(my_clf, number_of_bits_per_feature)
+            compiled_clf.build(path)
+            my_clf_test_predicted_quantized = compiled_clf.predict(
+                convert_to_integer(test_data, number_of_bits_per_feature)
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Compiled predictor could not be built ({e}), using own clf model instead")
+    if my_clf_test_predicted_quantized is None:
+        my_clf_test_predicted_quantized = my_clf.predict(test_data_quantized)
     print("own clf with train and test data quantized:")
     report_performance(my_clf, clf_type, test_target, my_clf_test_predicted_quantized)
 
-    differences_scikit_my = np.sum(test_predicted_quantized != my_clf_test_predicted_quantized)
+    differences_scikit_my = int(np.count_nonzero(test_predicted_quantized != my_clf_test_predicted_quantized))
     print(f"Number of differences between scikit_qunatized and my_quantized: {differences_scikit_my}")
 
     # check if own classifier works the same as scikit one
+    results = [test_predicted_quantized, my_clf_test_predicted_quantized]
+    results_names = ["scikit_quantized", "own_clf_quantized"]
+    if test_predicted is not None:
+        results.insert(0, test_predicted)
+        results_names.insert(0, "scikit")
     _compare_with_own_classifier(
-        [test_predicted, test_predicted_quantized, my_clf_test_predicted_quantized],
-        ["scikit", "scikit_quantized", "own_clf_quantized"],
+        results,
+        results_names,
         test_target,
         flag_save_details_to_file=True, path=path
     )
@@ -76,21 +120,25 @@ def test_dataset(
     # _test_classification_performance(clf, test_data, 10, 10)
 
 
+# not a unit test, even though the name looks like one
+test_dataset.__test__ = False
+
+
 def report_performance(
         clf, clf_type: ClassifierType,
         expected: np.ndarray, predicted: np.ndarray,
-        result_file: Optional[str]=None
+        result_sink: Optional[TextIO]=None
 ):
     if clf_type == ClassifierType.RANDOM_FOREST_REGRESSOR:
-        _report_regressor(expected, predicted, result_file)
+        _report_regressor(expected, predicted, result_sink)
     else:
-        _report_classifier(clf, expected, predicted, result_file)
+        _report_classifier(clf, expected, predicted, result_sink)
 
 
 def _report_classifier(
         clf,
         expected: np.ndarray, predicted: np.ndarray,
-        result_file: Optional[str]=None
+        result_sink: Optional[TextIO]=None
 ):
     t = ''
     t += 'Detailed classification report:\n'
@@ -98,31 +146,44 @@ def _report_classifier(
     t += 'Classification report for classifier ' + str(clf) + '\n'
     t += str(metrics.classification_report(expected, predicted)) + '\n'
     cm = metrics.confusion_matrix(expected, predicted)
-    cm = cm / cm.sum(axis=1)[:, None] * 100
 
     # np.set_printoptions(formatter={'float': '{: 2.2f}'.format})
-    t += f'Confusion matrix:\n {cm}\n'
+    t += f'Confusion matrix:\n {cm / cm.sum(axis=1)[:, None] * 100}\n'
 
-    f1_score = metrics.f1_score(expected, predicted, average='weighted')
-    precision = metrics.precision_score(expected, predicted, average='weighted')
-    recall = metrics.recall_score(expected, predicted, average='weighted')
-    accuracy = metrics.accuracy_score(expected, predicted)
+    f1_score, precision, recall, accuracy = _scores_from_confusion_matrix(cm)
     t += f'f1_score: {f1_score:{2}.{4}}\n'
     t += f'precision: {precision:{2}.{4}}\n'
     t += f'recall: {recall:{2}.{4}}\n'
     t += f'accuracy: {accuracy:{2}.{4}}\n'
 
-    if result_file is not None:
-        with open(result_file, 'a+') as f:
-            f.write(t)
+    if result_sink is not None:
+        result_sink.write(t)
     else:
         print(t)
 
 
+def _scores_from_confusion_matrix(cm: np.ndarray) -> Tuple[float, float, float, float]:
+    # all the scores are derived from the confusion matrix instead of going through the predictions again
+    # (weighted by support, the same as average='weighted' in scikit)
+    true_positives = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted_positives = cm.sum(axis=0)
+    precisions = true_positives / np.maximum(predicted_positives, 1)
+    recalls = true_positives / np.maximum(support, 1)
+    f1_scores = 2 * precisions * recalls / np.maximum(precisions + recalls, 1e-12)
+
+    f1_score = np.sum(f1_scores * support) / np.sum(support)
+    precision = np.sum(precisions * support) / np.sum(support)
+    recall = np.sum(recalls * support) / np.sum(support)
+    accuracy = np.sum(true_positives) / np.sum(cm)
+
+    return f1_score, precision, recall, accuracy
+
+
 def _report_regressor(
         expected: np.ndarray,
         predicted: np.ndarray,
-        result_file: Optional[str]=None
+        result_sink: Optional[TextIO]=None
 ):
     t = ''
     t += 'Detailed regression report:\n'
@@ -136,9 +197,8 @@ def _report_regressor(
     t += f'coefficient_of_determination: {r2s:{2}.{4}}\n'
     t += f'explained_variance_score: {evs:{2}.{4}}\n'
 
-    if result_file is not None:
-        with open(result_file, 'a+') as f:
-            f.write(t)
+    if result_sink is not None:
+        result_sink.write(t)
     else:
         print(t)
 
@@ -172,27 +232,20 @@ def _compare_with_own_classifier(results: [], results_names: [str],
                                  flag_save_details_to_file: bool = True,
                                  path: str = "./"
                                  ):
-    flag_no_errors = True
-    number_of_errors = np.zeros(len(results))
+    results_array = np.stack([np.asarray(result) for result in results])
+    # targets can be stored as a column vector (e.g. EMG dataset), hence ravel
+    mismatches = results_array != np.ravel(test_target)[None, :]
+    number_of_errors = mismatches.sum(axis=1, dtype=np.int64)
+    flag_no_errors = not mismatches.any()
 
-    comparision_file = None
     if flag_save_details_to_file:
-        comparision_file = open(path + "/comparision_details.txt", "w")
-
-    for j in range(0, len(test_target)):
-        flag_iteration_error = False
-
-        for i in range(0, len(results)):
-            if results[i][j] != test_target[j]:
-                number_of_errors[i] += 1
-                flag_no_errors = False
-                flag_iteration_error = True
-
-        if flag_iteration_error and flag_save_details_to_file:
-            print("Difference between versions!", file=comparision_file)
-            print("Ground true: " + str(test_target[j]), file=comparision_file)
-            for i in range(0, len(results)):
-                print(f"{results_names[i]}: {results[i][j]}", file=comparision_file)
+        with open(path + "/comparision_details.txt", "w") as comparision_file:
+            # only the samples where at least one of the versions made a mistake are reported
+            for j in np.flatnonzero(mismatches.any(axis=0)):
+                print("Difference between versions!", file=comparision_file)
+                print("Ground true: " + str(test_target[j]), file=comparision_file)
+                for i in range(0, len(results)):
+                    print(f"{results_names[i]}: {results[i][j]}", file=comparision_file)
 
     if flag_no_errors:
         print("All results were the same")
@@ -203,13 +256,13 @@ def _compare_with_own_classifier(results: [], results_names: [str],
 
 def _test_classification_performance(clf, test_data, number_of_data_to_test=1000, number_of_iterations=1000):
     if number_of_data_to_test <= len(test_data):
-        start = time.clock()
+        start = time.perf_counter()
 
+        # all the data is classified with a single call, so scikit can process it in batch
         for i in range(0, number_of_iterations):
-            for data in test_data[:number_of_data_to_test]:
-                clf.predict([data])
+            clf.predict(test_data[:number_of_data_to_test])
 
-        end = time.clock()
+        end = time.perf_counter()
         elapsed_time = (end - start)
 
         print("It takes " +
@@ -222,24 +275,36 @@ def _test_classification_performance(clf, test_data, number_of_data_to_test=1000
 
 
 # there is no general method for normalisation, so it was moved to be a part of each dataset
-def normalise_data(train_data: np.ndarray, test_data: np.ndarray):
-    from sklearn import preprocessing
+def normalise_data(train_data: np.ndarray, test_data: np.ndarray, verbose: bool = False):
+    # the comparison with other normalisation methods is only computed on request, as it takes a few extra passes
+    if verbose:
+        from sklearn import preprocessing
+
+        print("np.max(train_data): " + str(np.max(train_data)))
+        print("np.ptp(train_data): " + str(np.ptp(train_data)))
+
+        normalised_1 = 1 - (train_data - np.max(train_data)) / -np.ptp(train_data)
+        normalised_2 = preprocessing.minmax_scale(train_data, axis=1)
 
-    print("np.max(train_data): " + str(np.max(train_data)))
-    print("np.ptp(train_data): " + str(np.ptp(train_data)))
+        print(train_data[0])
 
-    normalised_1 = 1 - (train_data - np.max(train_data)) / -np.ptp(train_data)
-    normalised_2 = preprocessing.minmax_scale(train_data, axis=1)
+    # in place, multiplying by 1/16 is exact and cheaper than division
+    train_data *= 1 / 16
+    test_data *= 1 / 16
 
-    print(train_data[0])
+    if verbose:
+        print("Are arrays equal: " + str(np.array_equal(normalised_2, train_data)))
+        print("Are arrays equal: " + str(np.array_equal(normalised_1, train_data)))
 
-    train_data /= 16
-    test_data /= 16
 
-    print("Are arrays equal: " + str(np.array_equal(normalised_2, train_data)))
-    print("Are arrays equal: " + str(np.array_equal(normalised_1, train_data)))
+def test_scores_from_confusion_matrix():
+    rng = np.random.RandomState(42)
+    expected = rng.randint(0, 5, 500)
+    # class 5 appears only in the predictions
+    predicted = np.where(rng.rand(500) < 0.6, expected, rng.randint(0, 6, 500))
 
-    for i in range(0, 1):
-        print(train_data[i])
-        print(normalised_1)
-        print(normalised_2)
+    f1_score, precision, recall, accuracy = _scores_from_confusion_matrix(metrics.confusion_matrix(expected, predicted))
+    assert np.isclose(f1_score, metrics.f1_score(expected, predicted, average='weighted'))
+    assert np.isclose(precision, metrics.precision_score(expected, predicted, average='weighted'))
+    assert np.isclose(recall, metrics.recall_score(expected, predicted, average='weighted'))
+    assert np.isclose(accuracy, metrics.accuracy_score(expected, predicted))
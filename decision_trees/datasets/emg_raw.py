@@ -1,7 +1,10 @@
 from typing import Tuple, List
-import csv
+import glob
+import hashlib
 import os
 import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
 
 from decision_trees.datasets.dataset_base import DatasetBase
 from decision_trees.gridsearch import perform_gridsearch
@@ -9,6 +12,8 @@ from decision_trees.utils.constants import ClassifierType, GridSearchType
 
 
 class EMGRaw(DatasetBase):
+    _CACHE_VERSION = 1
+
     def __init__(self, path: str):
         self._path = path
         self._min_rms = float('inf')
@@ -17,40 +22,43 @@ class EMGRaw(DatasetBase):
         self._max_zero_crossings = 0.0
 
     def _update_min_max(self, data: np.ndarray):
-        rms = data[:, :8]
-        min_rms = np.amin(rms)
-        max_rms = np.amax(rms)
-
-        zero_crossings = data[:, 8:]
-        min_zero_crossings = np.amin(zero_crossings)
-        max_zero_crossings = np.amax(zero_crossings)
-
-        if min_rms < self._min_rms:
-            self._min_rms = min_rms
-        if max_rms > self._max_rms:
-            self._max_rms = max_rms
-        if min_zero_crossings < self._min_zero_crossings:
-            self._min_zero_crossings = min_zero_crossings
-        if max_zero_crossings > self._max_zero_crossings:
-            self._max_zero_crossings = max_zero_crossings
+        # per column extremes are computed in one sweep over the whole (row-major) array,
+        # only the short per column vectors are then split into rms and zero crossings parts
+        columns_min = data.min(axis=0)
+        columns_max = data.max(axis=0)
+
+        self._min_rms = min(self._min_rms, float(columns_min[:8].min()))
+        self._max_rms = max(self._max_rms, float(columns_max[:8].max()))
+        self._min_zero_crossings = min(self._min_zero_crossings, float(columns_min[8:].min()))
+        self._max_zero_crossings = max(self._max_zero_crossings, float(columns_max[8:].max()))
+
+    @staticmethod
+    def _read_files(files_paths: List[str], dtype: type) -> np.ndarray:
+        return np.concatenate(
+            [pd.read_csv(file_path, header=None, dtype=dtype).to_numpy() for file_path in files_paths], axis=0
+        )
 
     def _load_files(self, files_paths: List[str], is_output: bool) -> np.ndarray:
-        data: List[Tuple[float, ...]] = []
-        for file_path in files_paths:
-            with open(file_path) as csv_file:
-                reader = csv.reader(csv_file)
-                for row in reader:
-                    if is_output:
-                        data.append((row.index('1'),))
-                    else:
-                        data.append(tuple(map(float, row)))
-
-        data_array = np.array(data, dtype=np.float32)
-        if not is_output:
+        if is_output:
+            # outputs are stored as one-hot rows, convert them to the class index
+            data_array = self._read_files(files_paths, np.int8)
+            data_array = np.argmax(data_array == 1, axis=1).astype(np.int64)[:, None]
+        else:
+            data_array = self._read_files(files_paths, np.float32)
             self._update_min_max(data_array)
 
         return data_array
 
+    def _get_cache_file(self, files_paths: List[str]) -> str:
+        files_stats = sorted(
+            (os.path.basename(file_path), os.stat(file_path).st_size, os.stat(file_path).st_mtime_ns)
+            for file_path in files_paths
+        )
+        # the cached data is already normalised, so the version has to be changed whenever loading/normalisation does
+        signature = hashlib.md5(str((self._CACHE_VERSION, files_stats)).encode()).hexdigest()
+
+        return os.path.join(self._path, f'.cache_{signature}.npz')
+
     def load_data(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         input_train_files = []
         output_train_files = []
@@ -67,6 +75,15 @@ class EMGRaw(DatasetBase):
             elif 'test_o' in file.name:
                 output_test_files.append(file.path)
 
+        # parsing csv files is slow, so the prepared data is cached and reused as long as the files are not modified
+        cache_file = self._get_cache_file(input_train_files + output_train_files + input_test_files + output_test_files)
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as cache:
+                self._min_rms, self._max_rms, self._min_zero_crossings, self._max_zero_crossings = \
+                    cache['min_max'].tolist()
+
+                return cache['input_train'], cache['output_train'], cache['input_test'], cache['output_test']
+
         input_train_data = self._load_files(input_train_files, is_output=False)
         output_train_data = self._load_files(output_train_files, is_output=True)
         input_test_data = self._load_files(input_test_files, is_output=False)
@@ -75,11 +92,37 @@ class EMGRaw(DatasetBase):
         input_train_data = self._normalise(input_train_data)
         input_test_data = self._normalise(input_test_data)
 
+        # the cache is optional, e.g. the dataset directory might be read only
+        try:
+            # caches of previous versions of the files are never used again
+            for old_cache_file in glob.glob(os.path.join(glob.escape(self._path), '.cache_*.npz')):
+                os.remove(old_cache_file)
+            np.savez(
+                cache_file,
+                input_train=input_train_data, output_train=output_train_data,
+                input_test=input_test_data, output_test=output_test_data,
+                min_max=np.array(
+                    [self._min_rms, self._max_rms, self._min_zero_crossings, self._max_zero_crossings],
+                    dtype=np.float64
+                )
+            )
+        except OSError as e:
+            print(f"Could not save the dataset cache: {e}")
+
         return input_train_data, output_train_data, input_test_data, output_test_data
 
     def _normalise(self, data: np.ndarray):
-        data[:, :8] = (data[:, :8] - self._min_rms) / (self._max_rms - self._min_rms)
-        data[:, 8:] = (data[:, 8:] - self._min_zero_crossings) / (self._max_zero_crossings - self._min_zero_crossings)
+        # scale with precomputed reciprocals and work in place on the views to avoid temporaries
+        inv_rms = np.float32(1.0 / (self._max_rms - self._min_rms))
+        inv_zero_crossings = np.float32(1.0 / (self._max_zero_crossings - self._min_zero_crossings))
+
+        rms = data[:, :8]
+        np.subtract(rms, np.float32(self._min_rms), out=rms)
+        np.multiply(rms, inv_rms, out=rms)
+
+        zero_crossings = data[:, 8:]
+        np.subtract(zero_crossings, np.float32(self._min_zero_crossings), out=zero_crossings)
+        np.multiply(zero_crossings, inv_zero_crossings, out=zero_crossings)
 
         return data
 
@@ -96,17 +139,31 @@ def main():
     # d.test_as_classifier(8, './../../data/vhdl/')
 
     from decision_trees import dataset_tester
-    from decision_trees.utils.constants import ClassifierType
-
-    for i in [1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 16]:
-        dataset_tester.test_dataset(
+    from decision_trees.utils.constants import ClassifierType, get_classifier
+
+    # the scikit classifier trained on non-quantized data does not depend on the number of bits, so train it only once
+    clf = get_classifier(ClassifierType.RANDOM_FOREST, max_depth=None, number_of_classifiers=100)
+    clf.fit(train_data, train_target)
+    test_predicted = clf.predict(test_data)
+    print("scikit clf with test data:")
+    dataset_tester.report_performance(clf, ClassifierType.RANDOM_FOREST, test_target, test_predicted)
+
+    # every number of bits is tested in a separate process (the results are stored in separate directories),
+    # the classifiers themselves are single threaded to avoid oversubscription - with 11 independent runs this
+    # scales better than parallel training inside a single random forest, as long as there are enough cores available
+    Parallel(n_jobs=-1, backend='loky')(
+        delayed(dataset_tester.test_dataset)(
             i,
             train_data, train_target, test_data, test_target,
             ClassifierType.RANDOM_FOREST,
             max_depth=None, number_of_classifiers=100,
-            path='./../../data/vhdl/', name=d.__class__.__name__
+            path='./../../data/vhdl/', name=d.__class__.__name__,
+            test_predicted=test_predicted,
+            number_of_jobs=1,
+            skip_unquantized=True
         )
-
+        for i in [1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 16]
+    )
 
     # perform_gridsearch(train_data, train_target,
     #                    test_data, test_target,
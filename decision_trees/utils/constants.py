@@ -20,14 +20,21 @@ class GridSearchType(Enum):
 def get_classifier(
         clf_type: ClassifierType,
         max_depth: Optional[int]=None,
-        number_of_classifiers: Optional[int]=100
+        number_of_classifiers: Optional[int]=100,
+        number_of_jobs: Optional[int]=-1
 ):
     if clf_type == ClassifierType.DECISION_TREE:
         clf = DecisionTreeClassifier(max_depth=max_depth, random_state=42)
     elif clf_type == ClassifierType.RANDOM_FOREST:
-        clf = RandomForestClassifier(n_estimators=number_of_classifiers, max_depth=max_depth, n_jobs=3, random_state=42)
+        clf = RandomForestClassifier(
+            n_estimators=number_of_classifiers, max_depth=max_depth, max_features='sqrt', bootstrap=True,
+            n_jobs=number_of_jobs, random_state=42
+        )
     elif clf_type == ClassifierType.RANDOM_FOREST_REGRESSOR:
-        clf = RandomForestRegressor(n_estimators=number_of_classifiers, max_depth=max_depth, n_jobs=3, random_state=42)
+        clf = RandomForestRegressor(
+            n_estimators=number_of_classifiers, max_depth=max_depth,
+            n_jobs=number_of_jobs, random_state=42
+        )
     else:
         raise ValueError("Unknown classifier type specified")
 
@@ -11,10 +11,29 @@ def convert_to_fixed_point(float_value: float, n_bits: int) -> float:
     return np.round(float_value * f) * (1.0 / f)
 
 
+def get_integer_dtype(n_bits: int) -> np.dtype:
+    # values from [0, 1] range take up to 2**n_bits (1.0 is included) after conversion, hence n_bits+1 bits are needed
+    if n_bits < 7:
+        return np.dtype(np.int8)
+    elif n_bits < 15:
+        return np.dtype(np.int16)
+    else:
+        return np.dtype(np.int32)
+
+
+def convert_to_integer(data: np.ndarray, n_bits: int) -> np.ndarray:
+    # the quantization is uniform for all features: scale is 2**-n_bits and zero point is 0
+    # values outside of [0, 1] range are saturated instead of being wrapped around by the conversion
+    integer_dtype = get_integer_dtype(n_bits)
+    integer_info = np.iinfo(integer_dtype)
+
+    return np.clip(np.round(data * (1 << n_bits)), integer_info.min, integer_info.max).astype(integer_dtype)
+
+
 def quantize_data(train_data: np.ndarray, test_data: np.ndarray, number_of_bits: int,
                   flag_save_details_to_file: bool = False, path: str = './'):
-    train_data_quantized = np.array([convert_to_fixed_point(x, number_of_bits) for x in train_data])
-    test_data_quantized = np.array([convert_to_fixed_point(x, number_of_bits) for x in test_data])
+    train_data_quantized = convert_to_fixed_point(train_data, number_of_bits)
+    test_data_quantized = convert_to_fixed_point(test_data, number_of_bits)
 
     if flag_save_details_to_file:
         with open(path + 'quantization_comparision.txt', 'w') as file_quantization:
@@ -23,6 +42,8 @@ def quantize_data(train_data: np.ndarray, test_data: np.ndarray, number_of_bits:
                   np.array2string(train_data[0], formatter={'float': lambda x: '%.3f' % x}),
                   file=file_quantization)
             print(f'Size after quantization: {len(train_data_quantized)}', file=file_quantization)
+            print(f'Scale: 2**-{number_of_bits}, zero point: 0, '
+                  f'integer type: {get_integer_dtype(number_of_bits)}', file=file_quantization)
             print(f'First element after quantization:\n' +
                   np.array2string(train_data_quantized[0], formatter={'float': lambda x: '%.3f' % x}),
                   file=file_quantization)
@@ -35,6 +56,20 @@ def test_convert_to_fixed_point():
     assert convert_to_fixed_point(1 / 3, 3) == 0.375
 
 
+def test_get_integer_dtype():
+    assert get_integer_dtype(6) == np.int8
+    assert get_integer_dtype(7) == np.int16
+    assert get_integer_dtype(14) == np.int16
+    assert get_integer_dtype(15) == np.int32
+
+
+def test_convert_to_integer():
+    for n_bits in [6, 7, 14, 15]:
+        assert convert_to_integer(np.array([0.0, 1.0]), n_bits).tolist() == [0, 2**n_bits]
+    assert convert_to_integer(np.array([1.0, 1.5, 2.0]), 6).tolist() == [64, 96, 127]
+    assert convert_to_integer(np.array([-3.0]), 6).tolist() == [-128]
+
+
 if __name__ == "__main__":
     value = 13 / 16
     print(value)
@@ -24,14 +24,18 @@ class RandomForest(VHDLCreator):
 
             self.random_forest.append(tree_builder)
 
-    # TODO(MF): this could probably be moved as a common element for random forest and decision tree
     def predict(self, input_data: np.ndarray) -> np.ndarray:
-        result_data = np.empty(len(input_data))
+        number_of_classes = len(self.random_forest[0].leaves[0].class_idx[0])
+        votes = np.zeros((len(input_data), number_of_classes), dtype=np.int32)
+        samples_indices = np.arange(len(input_data))
 
-        for i in range(len(input_data)):
-            result_data[i] = self._predict_one_sample(input_data[i])
+        # all the trees use the same representation of the input, so it is prepared (and transposed) only once
+        input_data_transposed = self.random_forest[0]._prepare_input(input_data)
+        for tree in self.random_forest:
+            votes[samples_indices, tree._predict_prepared(input_data_transposed)] += 1
 
-        return result_data
+        # argmax returns the first of the maximal values, so in case of a tie the lowest class is chosen (as in scikit)
+        return np.argmax(votes, axis=1)
 
     def _predict_one_sample(self, input_data: np.ndarray) -> int:
         # first create a dictionary that will store the results
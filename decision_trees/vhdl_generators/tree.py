@@ -1,6 +1,6 @@
 from decision_trees.vhdl_generators.VHDLCreator import VHDLCreator
 
-from typing import Union
+from typing import Tuple, Union
 
 import numpy as np
 import sklearn.tree
@@ -69,6 +69,8 @@ class Tree(VHDLCreator):
         self.leaves = []
         self.decide_class_compares = 0
 
+        self._arrays = None
+
         VHDLCreator.__init__(self, name, name,
                              number_of_features, number_of_bits_per_feature)
 
@@ -78,6 +80,7 @@ class Tree(VHDLCreator):
 
         self.splits = []
         self.leaves = []
+        self._arrays = None
 
         following_splits_IDs = []
         following_splits_compare_values = []
@@ -94,12 +97,63 @@ class Tree(VHDLCreator):
         self._preorder(tree.tree_, features, following_splits_IDs, following_splits_compare_values, 0)
 
     def predict(self, input_data: np.ndarray) -> np.ndarray:
-        result_data = np.empty(len(input_data))
+        return self._predict_prepared(self._prepare_input(input_data))
+
+    def _prepare_input(self, input_data: np.ndarray) -> np.ndarray:
+        # compare values are integers, so the input is scaled the same way (multiplying by 2**n is exact)
+        input_data_scaled = np.asarray(input_data, dtype=np.float64) * (1 << self._number_of_bits_per_feature)
+
+        return np.ascontiguousarray(input_data_scaled.T)
+
+    def _predict_prepared(self, input_data_transposed: np.ndarray) -> np.ndarray:
+        # the tree is flattened on the first call and traversed with jit compiled code,
+        # _predict_one_sample is kept as a reference of how the vhdl implementation works
+        if self._arrays is None:
+            feature, threshold, left, right, value = self.to_arrays()
+            leaves = left < 0
+            nodes = np.arange(len(left), dtype=np.int32)
+            feature[leaves] = 0
+            left[leaves] = nodes[leaves]
+            right[leaves] = nodes[leaves]
+            self._arrays = (feature, threshold, left, right, value, self.find_depth())
+
+        # numba is imported only here, so generating vhdl does not pay for it
+        from decision_trees.vhdl_generators.tree_predictor import predict_all
+
+        return predict_all(input_data_transposed, *self._arrays)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # flattens the tree into node arrays (splits first, with their ids kept, then leaves), root is always node 0
+        # compare values are returned as integers, the same as in the vhdl implementation
+        number_of_splits = len(self.splits)
+        number_of_nodes = number_of_splits + len(self.leaves)
+
+        feature = np.full(number_of_nodes, -1, dtype=np.int32)
+        threshold = np.zeros(number_of_nodes, dtype=np.int32)
+        left = np.full(number_of_nodes, -1, dtype=np.int32)
+        right = np.full(number_of_nodes, -1, dtype=np.int32)
+        value = np.full(number_of_nodes, -1, dtype=np.int32)
+
+        for split in self.splits:
+            feature[split.id] = split.var_idx
+            threshold[split.id] = convert_fixed_point_to_integer(
+                split.value_to_compare, self._number_of_bits_per_feature
+            )
 
-        for i in range(len(input_data)):
-            result_data[i] = self._predict_one_sample(input_data[i])
+        for leaf in self.leaves:
+            leaf_node = number_of_splits + leaf.id
+            # find the most important class
+            value[leaf_node] = np.argmax(leaf.class_idx[0])
+
+            # the path to the leaf describes which child of every split on the way should be taken
+            path = leaf.following_split_IDs + [leaf_node]
+            for split_id, compare_value, child in zip(path, leaf.following_split_compare_values, path[1:]):
+                if compare_value == 0:
+                    left[split_id] = child
+                else:
+                    right[split_id] = child
 
-        return result_data
+        return feature, threshold, left, right, value
 
     def _predict_one_sample(self, input_data):
         # this code works in a similar way to how vhdl implementation of the tree works
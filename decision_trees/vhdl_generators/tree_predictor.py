@@ -0,0 +1,33 @@
+import numpy as np
+from numba import njit, prange
+
+
+_PREDICTION_BATCH_SIZE = 64
+
+
+@njit(parallel=True, cache=True)
+def predict_all(input_data_transposed, feature, threshold, left, right, value, depth):
+    # input is transposed (features x samples), so one feature of consecutive samples lies next to each other
+    # samples are processed in batches, level by level, all of them moving one node down at each step
+    # leaves point to themselves, hence the inner loop has no branches and can be vectorised
+    number_of_samples = input_data_transposed.shape[1]
+    number_of_batches = (number_of_samples + _PREDICTION_BATCH_SIZE - 1) // _PREDICTION_BATCH_SIZE
+    result_data = np.empty(number_of_samples, np.int32)
+
+    for batch in prange(number_of_batches):
+        start = batch * _PREDICTION_BATCH_SIZE
+        end = min(start + _PREDICTION_BATCH_SIZE, number_of_samples)
+        nodes = np.zeros(end - start, np.int32)
+
+        for _ in range(depth):
+            for i in range(end - start):
+                node = nodes[i]
+                if input_data_transposed[feature[node], start + i] <= threshold[node]:
+                    nodes[i] = left[node]
+                else:
+                    nodes[i] = right[node]
+
+        for i in range(end - start):
+            result_data[start + i] = value[nodes[i]]
+
+    return result_data
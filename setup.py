@@ -20,6 +20,9 @@ setup(
         'scikit-image <0.15',
         'numpy <2.0',
         'scipy <2.0',
+        'pandas <1.0',
+        'joblib',
+        'numba',
         'matplotlib <3.0',
         'click <7.0',
     ],